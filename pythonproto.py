@@ -1,18 +1,83 @@
 import os
 import sys
+import mmap
 import struct
 import time
+import bisect
+import hashlib
+import heapq
+import itertools
+import array
+import contextlib
+import collections
+from concurrent.futures import ProcessPoolExecutor
 import argparse
 import re
 import math
-from collections import defaultdict
-from datetime import datetime
+
+import numpy as np
+
+# Numba is optional and only imported by the indexer (enable_numba); search never
+# runs a kernel, so it should not pay for the import. Until then kernels are plain Python.
+HAVE_NUMBA = False
+KERNELS = []
+
+def kernel(fn):
+    KERNELS.append(fn.__name__)
+    return fn
+
+def enable_numba():
+    # Rebind every @kernel to its njit version, in definition order, so helpers are
+    # dispatchers by the time the kernels calling them compile
+    global HAVE_NUMBA
+    if HAVE_NUMBA:
+        return True
+    # The on-disk kernel cache lives with the index; numba reads this at import
+    os.environ.setdefault('NUMBA_CACHE_DIR', os.path.join(INDEX_DIR, '_jitcache'))
+    try:
+        from numba import njit, types
+    except ImportError:
+        return False
+    # Entry kernels get explicit signatures, so they compile (or load from the cache)
+    # here rather than on the first file; mmap'd buffers are read-only
+    signatures = {
+        'scan_identifiers': (types.Array(types.uint8, 1, 'C', readonly=True), types.int64),
+        'encode_varint_deltas': (types.int32[::1], types.intp[::1]),
+    }
+    g = globals()
+    for name in KERNELS:
+        g[name] = njit(signatures.get(name), cache=True)(g[name])
+    HAVE_NUMBA = True
+    return True
 
 # --- Constants & Config ---
 INDEX_DIR = ".devscope"
 DOCS_FILE = "docs.bin"
 INDEX_FILE = "index.bin"
 LEXICON_FILE = "lexicon.bin"
+PATHS_FILE = "paths.bin" # path blob referenced by docs.bin
+TERMS_FILE = "terms.bin" # term blob referenced by lexicon.bin
+BLOOM_FILE = "lexicon.blm" # bloom filter over lexicon terms
+
+# Fixed-width records so the searcher can mmap them instead of parsing
+# docs.bin: DocID(4), Type(1), ExtID(1), PathOffset(8), PathLen(2), TMin(8), TMax(8); record i is doc i+1
+DOC_RECORD = struct.Struct('<IBBQHqq')
+DOC_DTYPE = np.dtype([('doc_id', '<u4'), ('type', 'u1'), ('ext_id', 'u1'), ('path_offset', '<u8'),
+                      ('path_len', '<u2'), ('t_min', '<i8'), ('t_max', '<i8')])
+# lexicon.bin: TermHash(8), TermOffset(4), TermLen(1), DocFreq(4), Offset(8); sorted by hash
+LEX_DTYPE = np.dtype([('hash', '<u8'), ('term_offset', '<u4'), ('term_len', 'u1'),
+                      ('df', '<u4'), ('offset', '<u8')])
+# index.bin: one SoA block per term, df postings each, padded to 4 bytes:
+# DocIDs(4*df), Freqs(4*df), PosOffsets(4*df), Metas(df), Positions(varint deltas)
+# index.bin.partK spill shards, sorted by hash: per term
+# TermHash(8), TermLen(4), DocFreq(4), PosBlobLen(4), Term(N), index.bin block
+SHARD_ENTRY = struct.Struct('<QIII')
+SHARD_BYTES = 512 << 20 # approx. in-memory posting bytes before spilling a shard
+ROW_BYTES = 13 # hash(8) + position(4) + meta(1) per buffered row; the flush sort needs as much again
+TERM_OVERHEAD = 150 # term_by_hash entry: key, str and dict slot, roughly
+WRITE_BUFFER = 1 << 20 # the indexer issues many small writes; batch them into 1 MiB syscalls
+# lexicon.blm: NumBits(8), NumHashes(4), Bits(NumBits/8)
+BLOOM_HEADER = struct.Struct('<QI')
 
 # Meta Filtering
 META_NONE = 0
@@ -24,28 +89,68 @@ META_LOG_WARN = 1 << 3
 DOC_TYPE_CODE = 0
 DOC_TYPE_LOG = 1
 
+LOG_EXTENSIONS = ('.log',)
+CODE_EXTENSIONS = ('.go', '.py', '.js', '.ts', '.c', '.cpp', '.java', '.md', '.txt', '.json')
+# Interned extensions: ExtID in docs.bin, 0 = none
+EXT_IDS = {ext: i + 1 for i, ext in enumerate(LOG_EXTENSIONS + CODE_EXTENSIONS)}
+
 # --- Tokenizer ---
+# ASCII semantics (\s, IGNORECASE) so the regex path agrees with the byte scanner
 RE_IDENTIFIER = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')
-RE_FUNC_DEF = re.compile(r'(func|def|function|class|struct)\s+([a-zA-Z_][a-zA-Z0-9_]*)')
+RE_FUNC_DEF = re.compile(r'(func|def|function|class|struct)\s+([a-zA-Z_][a-zA-Z0-9_]*)', re.ASCII)
+RE_LOG_ERROR = re.compile(r'ERROR', re.IGNORECASE | re.ASCII)
+RE_LOG_WARN = re.compile(r'WARN', re.IGNORECASE | re.ASCII)
 
-def parse_timestamp(line):
-    # Try generic ISO-like: 2025-12-20T10:00:00
-    if len(line) < 19:
+@kernel
+def _digits(b, i, k):
+    # k ASCII digits at b[i:i+k] -> int, or -1 if any is not a digit
+    v = 0
+    for j in range(i, i + k):
+        d = b[j] - 48
+        if d < 0 or d > 9:
+            return -1
+        v = v * 10 + d
+    return v
+
+@kernel
+def parse_ts_ascii(b, i):
+    # Generic ISO-like at b[i:i+19]: 2025-12-20T10:00:00 (or a space for T) -> Unix epoch, 0 if none.
+    # Integer-only days_from_civil (H. Hinnant); timestamps are taken as UTC.
+    if i + 19 > len(b):
         return 0
-    chunk = line[:19].replace(" ", "T")
-    try:
-        # crude parse
-        dt = datetime.strptime(chunk, "%Y-%m-%dT%H:%M:%S")
-        return int(dt.timestamp())
-    except ValueError:
+    if b[i + 4] != 45 or b[i + 7] != 45 or (b[i + 10] != 84 and b[i + 10] != 32) \
+            or b[i + 13] != 58 or b[i + 16] != 58:
+        return 0
+    y = _digits(b, i, 4)
+    m = _digits(b, i + 5, 2)
+    d = _digits(b, i + 8, 2)
+    hh = _digits(b, i + 11, 2)
+    mm = _digits(b, i + 14, 2)
+    ss = _digits(b, i + 17, 2)
+    if y < 0 or m < 1 or m > 12 or d < 1 or hh < 0 or hh > 23 or mm < 0 or mm > 59 or ss < 0 or ss > 59:
+        return 0
+    leap = y % 4 == 0 and (y % 100 != 0 or y % 400 == 0)
+    if d > ((29 if leap else 28) if m == 2 else 30 if m == 4 or m == 6 or m == 9 or m == 11 else 31):
         return 0
 
+    if m <= 2:
+        y -= 1
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m - 3 if m > 2 else m + 9) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    days = era * 146097 + doe - 719468
+    return days * 86400 + hh * 3600 + mm * 60 + ss
+
 def tokenize(path, doc_type):
-    tokens = []
+    # Parallel columns per token; lines/metas are raw C arrays, not lists of ints
+    terms, lines, metas = [], array.array('i'), array.array('B')
     min_ts, max_ts = 0, 0
     
     try:
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        # Lines end at \n only, and undecodable bytes survive as lone surrogates
+        # (never identifier chars), exactly as scan_identifiers() sees the raw bytes
+        with open(path, 'r', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
             line_num = 0
             for line in f:
                 line_num += 1
@@ -54,189 +159,712 @@ def tokenize(path, doc_type):
                 meta = META_NONE
                 
                 if doc_type == DOC_TYPE_LOG:
-                    ts = parse_timestamp(line)
+                    ts = parse_ts_ascii(line[:19].encode('utf-8', errors='surrogateescape'), 0)
                     if ts > 0:
                         if min_ts == 0 or ts < min_ts: min_ts = ts
                         if ts > max_ts: max_ts = ts
                     
-                    upper = line.upper()
-                    if "ERROR" in upper: meta |= META_LOG_ERROR
-                    elif "WARN" in upper: meta |= META_LOG_WARN
+                    if RE_LOG_ERROR.search(line): meta |= META_LOG_ERROR
+                    elif RE_LOG_WARN.search(line): meta |= META_LOG_WARN
+                    func_name = None
                 
                 else: # CODE
                     # Function detection
                     m = RE_FUNC_DEF.search(line)
                     func_name = m.group(2) if m else None
                 
-                # Extract terms
-                for m in RE_IDENTIFIER.finditer(line):
-                    term = m.group(0)
-                    term_meta = meta
-                    
-                    if doc_type == DOC_TYPE_CODE and func_name and term == func_name:
-                        term_meta |= META_IN_FUNCNAME
-                        
-                    tokens.append((term, line_num, term_meta))
+                # Extract terms: one C-level findall per line, no match objects
+                terms_on_line = RE_IDENTIFIER.findall(line)
+                terms.extend(terms_on_line)
+                lines.extend(itertools.repeat(line_num, len(terms_on_line)))
+                if func_name is None:
+                    metas.extend(itertools.repeat(meta, len(terms_on_line)))
+                else:
+                    func_meta = meta | META_IN_FUNCNAME
+                    metas.extend(func_meta if t == func_name else meta for t in terms_on_line)
                     
     except Exception as e:
         print(f"Warning: Failed to read {path}: {e}")
-        return [], 0, 0
+        return [], array.array('i'), array.array('B'), 0, 0
         
-    return tokens, min_ts, max_ts
+    return terms, lines, metas, min_ts, max_ts
+
+# --- Byte Scanner (Numba) ---
+# FNV-1a 64-bit; scan_identifiers() and term_hash() must agree
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+# Keywords that RE_FUNC_DEF treats as a function/type definition
+KW_FUNC = np.frombuffer(b'func', dtype=np.uint8)
+KW_DEF = np.frombuffer(b'def', dtype=np.uint8)
+KW_FUNCTION = np.frombuffer(b'function', dtype=np.uint8)
+KW_CLASS = np.frombuffer(b'class', dtype=np.uint8)
+KW_STRUCT = np.frombuffer(b'struct', dtype=np.uint8)
+
+def term_hash(term):
+    h = 0xcbf29ce484222325
+    for b in term.encode('utf-8'):
+        h = ((h ^ b) * 0x100000001b3) & 0xFFFFFFFFFFFFFFFF
+    return h
+
+@kernel
+def _is_ident_start(c):
+    return (c >= 65 and c <= 90) or (c >= 97 and c <= 122) or c == 95
+
+@kernel
+def _is_ident_char(c):
+    return _is_ident_start(c) or (c >= 48 and c <= 57)
+
+@kernel
+def _ends_with(buf, start, end, kw):
+    k = kw.shape[0]
+    if end - start < k:
+        return False
+    for i in range(k):
+        if buf[end - k + i] != kw[i]:
+            return False
+    return True
+
+@kernel
+def _is_func_keyword(buf, start, end):
+    # RE_FUNC_DEF has no left word boundary, so "myfunc foo" counts too
+    return (_ends_with(buf, start, end, KW_FUNC) or _ends_with(buf, start, end, KW_DEF)
+            or _ends_with(buf, start, end, KW_FUNCTION) or _ends_with(buf, start, end, KW_CLASS)
+            or _ends_with(buf, start, end, KW_STRUCT))
+
+@kernel
+def _only_spaces(buf, start, end):
+    if end <= start:
+        return False
+    for i in range(start, end):
+        c = buf[i]
+        if c != 32 and (c < 9 or c > 13):
+            return False
+    return True
+
+@kernel
+def _load4_lower(buf, i):
+    # 4 bytes as a little-endian word with the ASCII case bit set
+    return (np.uint32(buf[i]) | np.uint32(buf[i + 1]) << 8 | np.uint32(buf[i + 2]) << 16
+            | np.uint32(buf[i + 3]) << 24) | np.uint32(0x20202020)
+
+@kernel
+def _log_level(buf, start, end, level):
+    # Case-insensitive "error"/"warn" inside a term; ERROR wins like the old upper() check
+    for j in range(start, end - 3):
+        if j + 5 <= end and buf[j] | 0x20 == 0x65 and _load4_lower(buf, j + 1) == 0x726f7272: # e + "rror"
+            return META_LOG_ERROR
+        if _load4_lower(buf, j) == 0x6e726177: # "warn"
+            level = META_LOG_WARN
+    return level
+
+@kernel
+def _grow(a):
+    out = np.empty(a.shape[0] * 2, dtype=a.dtype)
+    out[:a.shape[0]] = a
+    return out
+
+@kernel
+def _mark_func(hashes, metas, first, count, func_hash):
+    for j in range(first, count):
+        if hashes[j] == func_hash:
+            metas[j] |= np.uint8(META_IN_FUNCNAME)
+
+@kernel
+def _mark_level(metas, first, count, level):
+    for j in range(first, count):
+        metas[j] |= np.uint8(level)
+
+@kernel
+def scan_identifiers(buf, doc_type):
+    # DFA over raw bytes: [A-Za-z_] starts a term, [A-Za-z0-9_] extends it, \n ends a line.
+    # Emits one row per term occurrence: hash, byte span, line number, meta.
+    n = buf.shape[0]
+    cap = max(n // 4, 16)
+    hashes = np.empty(cap, dtype=np.uint64)
+    starts = np.empty(cap, dtype=np.int64)
+    ends = np.empty(cap, dtype=np.int64)
+    lines = np.empty(cap, dtype=np.int32)
+    metas = np.zeros(cap, dtype=np.uint8)
+    count = 0
+
+    line_num = 1
+    line_first = 0 # first token row of the current line
+    kw_end = -1 # end of a definition keyword on this line, -1 if none
+    has_func = False
+    func_hash = FNV_OFFSET
+    level = META_NONE # ERROR/WARN bit of the current log line
+
+    min_ts = 0
+    max_ts = 0
+    if doc_type == DOC_TYPE_LOG:
+        min_ts = max_ts = parse_ts_ascii(buf, 0)
+
+    i = 0
+    while i < n:
+        c = buf[i]
+        if _is_ident_start(c):
+            start = i
+            h = FNV_OFFSET
+            while i < n and _is_ident_char(buf[i]):
+                h = (h ^ np.uint64(buf[i])) * FNV_PRIME
+                i += 1
+
+            if count == hashes.shape[0]:
+                hashes = _grow(hashes)
+                starts = _grow(starts)
+                ends = _grow(ends)
+                lines = _grow(lines)
+                metas = _grow(metas)
+            hashes[count] = h
+            starts[count] = start
+            ends[count] = i
+            lines[count] = line_num
+            metas[count] = 0
+            count += 1
+
+            if doc_type == DOC_TYPE_LOG and level != META_LOG_ERROR:
+                level = _log_level(buf, start, i, level)
+            elif doc_type == DOC_TYPE_CODE and not has_func:
+                # First "<keyword> <name>" on the line, like RE_FUNC_DEF.search
+                if kw_end >= 0 and _only_spaces(buf, kw_end, start):
+                    func_hash = h
+                    has_func = True
+                elif _is_func_keyword(buf, start, i):
+                    kw_end = i
+                else:
+                    kw_end = -1
+            continue
+
+        if c == 10:
+            if has_func:
+                _mark_func(hashes, metas, line_first, count, func_hash)
+            if level:
+                _mark_level(metas, line_first, count, level)
+                level = META_NONE
+            line_num += 1
+            line_first = count
+            kw_end = -1
+            has_func = False
+            if doc_type == DOC_TYPE_LOG:
+                ts = parse_ts_ascii(buf, i + 1)
+                if ts > 0:
+                    if min_ts == 0 or ts < min_ts: min_ts = ts
+                    if ts > max_ts: max_ts = ts
+        i += 1
+
+    if has_func:
+        _mark_func(hashes, metas, line_first, count, func_hash)
+    if level:
+        _mark_level(metas, line_first, count, level)
+
+    return hashes[:count], starts[:count], ends[:count], lines[:count], metas[:count], min_ts, max_ts
+
+def scan_file(path, doc_type, term_by_hash):
+    # Numba path: returns (hashes, lines, metas, min_ts, max_ts) and records
+    # the text of every hash not yet in term_by_hash.
+    hashes = np.empty(0, dtype=np.uint64)
+    lines = np.empty(0, dtype=np.int32)
+    metas = np.empty(0, dtype=np.uint8)
+    min_ts, max_ts = 0, 0
+
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hashes, lines, metas, 0, 0
+            # Not closed explicitly: while Numba compiles it can still hold the
+            # buffer export, so let the mapping go with its last reference.
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        hashes, starts, ends, lines, metas, min_ts, max_ts = scan_identifiers(buf, doc_type)
+
+        uniq, first = np.unique(hashes, return_index=True)
+        for h, i in zip(uniq.tolist(), first.tolist()):
+            if h not in term_by_hash:
+                term_by_hash[h] = mm[starts[i]:ends[i]].decode('ascii')
+
+    except Exception as e:
+        print(f"Warning: Failed to read {path}: {e}")
+        return hashes[:0], lines[:0], metas[:0], 0, 0
+
+    return hashes, lines, metas, min_ts, max_ts
+
+def tokenize_hashed(path, doc_type, term_by_hash):
+    # Pure-Python twin of scan_file() used when Numba is not installed
+    terms, lines, metas, min_ts, max_ts = tokenize(path, doc_type)
+    # Small int id per distinct term in one flat dict; each term is hashed once
+    term_ids = {}
+    ids = np.fromiter((term_ids.setdefault(t, len(term_ids)) for t in terms), dtype=np.intp, count=len(terms))
+    unique_hashes = np.fromiter(map(term_hash, term_ids), dtype=np.uint64, count=len(term_ids))
+    for term, h in zip(term_ids, unique_hashes.tolist()):
+        term_by_hash.setdefault(h, term)
+    return (unique_hashes[ids], np.frombuffer(lines, dtype=np.int32), np.frombuffer(metas, dtype=np.uint8),
+            min_ts, max_ts)
 
 # --- Indexer ---
 
-def write_doc(f, doc_id, doc_type, path, t_min, t_max):
-    # DocID(4), Type(1), PathLen(2), Path(N), TMin(8), TMax(8)
+class ShardBuffer:
+    # The current shard's occurrence rows, kept as each doc's columns as-is.
+    # Grouping into postings happens once per shard, at flush (iter_memory_terms).
+    __slots__ = ('hashes', 'lines', 'metas', 'doc_ids', 'counts')
+
+    def __init__(self):
+        self.hashes, self.lines, self.metas = [], [], []
+        self.doc_ids, self.counts = [], []
+
+    def add(self, doc_id, hashes, lines, metas):
+        # Returns roughly how many bytes the buffer grew by
+        if len(hashes) == 0:
+            return 0
+        # Copies, so a slice does not pin the scanner's oversized arrays
+        self.hashes.append(np.array(hashes))
+        self.lines.append(np.array(lines))
+        self.metas.append(np.array(metas))
+        self.doc_ids.append(doc_id)
+        self.counts.append(len(hashes))
+        return len(hashes) * ROW_BYTES
+
+@kernel
+def encode_varint_deltas(positions, starts):
+    # LEB128 of gaps between ascending positions, 1-5 bytes each. The gap
+    # restarts from 0 at every run in starts (one run per doc); returns the
+    # encoded bytes and the byte offset where each run begins.
+    out = np.empty(positions.shape[0] * 5, dtype=np.uint8)
+    offsets = np.empty(starts.shape[0], dtype=np.uint32)
+    n = 0
+    prev = 0
+    run = 0
+    for i in range(positions.shape[0]):
+        if run < starts.shape[0] and i == starts[run]:
+            offsets[run] = n
+            prev = 0
+            run += 1
+        v = positions[i] - prev
+        prev = positions[i]
+        while v >= 0x80:
+            out[n] = (v & 0x7f) | 0x80
+            v >>= 7
+            n += 1
+        out[n] = v
+        n += 1
+    return out[:n], offsets
+
+def encode_varint_deltas_numpy(positions, starts):
+    # Vectorised twin of encode_varint_deltas() for when Numba is missing:
+    # byte k of every gap is scattered in one pass, for k = 0..4
+    if len(positions) == 0:
+        return np.empty(0, dtype=np.uint8), np.zeros(len(starts), dtype=np.uint32)
+    prev = np.empty_like(positions)
+    prev[0] = 0
+    prev[1:] = positions[:-1]
+    prev[starts] = 0
+    gaps = (positions - prev).astype(np.uint32)
+    sizes = 1 + (gaps >= 1 << 7).astype(np.intp) + (gaps >= 1 << 14) + (gaps >= 1 << 21) + (gaps >= 1 << 28)
+    first = np.cumsum(sizes) - sizes
+    out = np.empty(int(first[-1] + sizes[-1]), dtype=np.uint8)
+    for k in range(5):
+        rows = np.flatnonzero(sizes > k)
+        if len(rows) == 0:
+            break
+        out[first[rows] + k] = ((gaps[rows] >> np.uint32(7 * k)) & 0x7f) | ((sizes[rows] > k + 1) << 7)
+    return out, first[starts].astype(np.uint32)
+
+def decode_varint(data, pos=0):
+    # -> (value, next_pos)
+    result = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+def pack_block(doc_ids, freqs, pos_offsets, metas, pos_blob):
+    # One term's index.bin block; padded so the next block's u32 arrays stay aligned
+    block = b''.join((doc_ids.astype('<u4', copy=False).tobytes(), freqs.astype('<u4', copy=False).tobytes(),
+                      pos_offsets.astype('<u4', copy=False).tobytes(), metas.tobytes(), pos_blob))
+    return block + b'\0' * (-len(block) % 4)
+
+def block_size(df, blob_len):
+    n = 13 * df + blob_len
+    return n + (-n % 4)
+
+def concat_blocks(run):
+    # run: (hash, term, df, blob_len, block) for one term, in shard (= doc_id) order.
+    # Each doc's varints restart from 0, so blobs concatenate as-is.
+    if len(run) == 1:
+        return run[0]
+    h, term = run[0][:2]
+    cols = {'doc_ids': [], 'freqs': [], 'pos_offsets': [], 'metas': [], 'blobs': []}
+    shift = 0
+    for _, _, df, blob_len, block in run:
+        cols['doc_ids'].append(np.frombuffer(block, dtype='<u4', count=df))
+        cols['freqs'].append(np.frombuffer(block, dtype='<u4', count=df, offset=4 * df))
+        cols['pos_offsets'].append(np.frombuffer(block, dtype='<u4', count=df, offset=8 * df) + shift)
+        cols['metas'].append(np.frombuffer(block, dtype=np.uint8, count=df, offset=12 * df))
+        cols['blobs'].append(block[13 * df:13 * df + blob_len])
+        shift += blob_len
+    doc_ids = np.concatenate(cols['doc_ids'])
+    block = pack_block(doc_ids, np.concatenate(cols['freqs']), np.concatenate(cols['pos_offsets']),
+                       np.concatenate(cols['metas']), b''.join(cols['blobs']))
+    return h, term, len(doc_ids), shift, block
+
+def iter_memory_terms(shard, term_by_hash):
+    # The shard's postings as (hash, term, df, blob_len, block), in hash order.
+    # One lexsort, one pass of run detection and one varint encode for the
+    # whole shard; only slicing and pack_block() are done per term.
+    if not shard.counts:
+        return
+    hashes = np.concatenate(shard.hashes)
+    lines = np.concatenate(shard.lines)
+    metas = np.concatenate(shard.metas)
+    doc_ids = np.repeat(np.array(shard.doc_ids, dtype=np.int32), shard.counts)
+    order = np.lexsort((lines, doc_ids, hashes))
+    hashes, lines, metas, doc_ids = hashes[order], lines[order], metas[order], doc_ids[order]
+
+    # A posting is a run of equal (hash, doc_id); a term is a run of equal hash
+    new_posting = np.ones(len(hashes), dtype=bool)
+    new_posting[1:] = (hashes[1:] != hashes[:-1]) | (doc_ids[1:] != doc_ids[:-1])
+    starts = np.flatnonzero(new_posting)
+    freqs = np.diff(np.append(starts, len(hashes))).astype('<u4')
+    post_metas = np.bitwise_or.reduceat(metas, starts)
+    post_docs = doc_ids[starts].astype('<u4')
+    post_hashes = hashes[starts]
+    encode = encode_varint_deltas if HAVE_NUMBA else encode_varint_deltas_numpy
+    pos_blob, pos_offsets = encode(lines, starts)
+
+    bounds = np.flatnonzero(np.diff(post_hashes)) + 1
+    firsts = [0] + bounds.tolist()
+    lasts = bounds.tolist() + [len(starts)]
+    blob_bounds = np.append(pos_offsets, len(pos_blob)).tolist()
+    for h, a, b in zip(post_hashes[firsts].tolist(), firsts, lasts):
+        base, end = blob_bounds[a], blob_bounds[b]
+        yield h, term_by_hash[h], b - a, end - base, pack_block(
+            post_docs[a:b], freqs[a:b], pos_offsets[a:b] - base, post_metas[a:b], pos_blob[base:end].tobytes())
+
+def write_shard(path, entries):
+    with open(path, 'wb', buffering=WRITE_BUFFER) as f:
+        for h, term, df, blob_len, block in entries:
+            term_bytes = term.encode('utf-8')
+            f.write(SHARD_ENTRY.pack(h, len(term_bytes), df, blob_len))
+            f.write(term_bytes)
+            f.write(block)
+
+def iter_shard(path):
+    mm = open_mmap(path)
+    pos = 0
+    while pos < len(mm):
+        h, term_len, df, blob_len = SHARD_ENTRY.unpack_from(mm, pos)
+        pos += SHARD_ENTRY.size
+        term = mm[pos:pos + term_len].decode('utf-8')
+        pos += term_len
+        size = block_size(df, blob_len)
+        yield h, term, df, blob_len, mm[pos:pos + size]
+        pos += size
+
+def write_index(entries):
+    # Single streaming pass over (hash, term, df, blob_len, block) in hash order.
+    # Lexicon columns are gathered as raw arrays and written with one tobytes().
+    lex_cols = {name: array.array(code) for name, code in
+                (('hash', 'Q'), ('term_offset', 'I'), ('term_len', 'B'), ('df', 'I'), ('offset', 'Q'))}
+    bloom_pairs = array.array('Q')
+    with open(os.path.join(INDEX_DIR, INDEX_FILE), 'wb', buffering=WRITE_BUFFER) as f_idx, \
+         open(os.path.join(INDEX_DIR, TERMS_FILE), 'wb', buffering=WRITE_BUFFER) as f_terms:
+         
+        offset_counter = 0
+        term_offset = 0
+        
+        for h, term, df, _, block in entries:
+            f_idx.write(block)
+            
+            term_bytes = term.encode('utf-8')[:255]
+            f_terms.write(term_bytes)
+            lex_cols['hash'].append(h)
+            lex_cols['term_offset'].append(term_offset)
+            lex_cols['term_len'].append(len(term_bytes))
+            lex_cols['df'].append(df)
+            lex_cols['offset'].append(offset_counter)
+            term_offset += len(term_bytes)
+            offset_counter += len(block)
+            bloom_pairs.extend(bloom_hashes(term))
+
+    # Hash order lets the searcher bisect the lexicon by term_hash()
+    lex = np.empty(len(lex_cols['hash']), dtype=LEX_DTYPE)
+    for name, col in lex_cols.items():
+        lex[name] = np.frombuffer(col, dtype=col.typecode)
+    with open(os.path.join(INDEX_DIR, LEXICON_FILE), 'wb') as f_lex:
+        f_lex.write(lex.tobytes())
+
+    pairs = np.frombuffer(bloom_pairs, dtype=np.uint64).reshape(-1, 2)
+    bloom = BloomFilter(len(pairs))
+    bloom.add_hashes(pairs)
+    bloom.save(os.path.join(INDEX_DIR, BLOOM_FILE))
+
+def write_doc(f, f_paths, doc_id, doc_type, path, t_min, t_max):
     path_bytes = path.encode('utf-8')
-    data = struct.pack('<IBH', doc_id, doc_type, len(path_bytes))
-    f.write(data)
-    f.write(path_bytes)
-    f.write(struct.pack('<qq', t_min, t_max))
+    ext_id = EXT_IDS.get(os.path.splitext(path)[1].lower(), 0)
+    f.write(DOC_RECORD.pack(doc_id, doc_type, ext_id, f_paths.tell(), len(path_bytes), t_min, t_max))
+    f_paths.write(path_bytes)
+
+def iter_files(target_path):
+    # -> (path, doc_type) for every indexable file under target_path
+    for root, dirs, files in os.walk(target_path):
+        if '.git' in dirs: dirs.remove('.git')
+        if 'node_modules' in dirs: dirs.remove('node_modules')
+        if '.devscope' in dirs: dirs.remove('.devscope')
+        
+        for file in files:
+            ext = os.path.splitext(file)[1].lower()
+            doc_type = -1
+            if ext in LOG_EXTENSIONS:
+                doc_type = DOC_TYPE_LOG
+            elif ext in CODE_EXTENSIONS:
+                doc_type = DOC_TYPE_CODE
+            
+            if doc_type == -1: continue
+            
+            yield os.path.join(root, file), doc_type
+
+def tokenize_file(job, term_by_hash=None):
+    # Process pool entry point. Workers share no state with the parent, so the
+    # text of every new term in the file is sent back alongside the hashes; the
+    # serial path passes the parent's term_by_hash to fill in place instead.
+    path, doc_type = job
+    terms = {} if term_by_hash is None else term_by_hash
+    scan = scan_file if HAVE_NUMBA else tokenize_hashed
+    hashes, lines, metas, min_ts, max_ts = scan(path, doc_type, terms)
+    return path, doc_type, hashes, lines, metas, terms, min_ts, max_ts
+
+def tokenize_chunk(jobs):
+    return [tokenize_file(job) for job in jobs]
+
+def map_bounded(pool, jobs, window, chunksize=16):
+    # Like pool.map(tokenize_file, jobs, chunksize=...), which submits every chunk up
+    # front; here at most `window` chunks are in flight, so finished results cannot
+    # pile up in the parent faster than it indexes them
+    jobs = iter(jobs)
+    pending = collections.deque()
+    for chunk in iter(lambda: list(itertools.islice(jobs, chunksize)), []):
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+        pending.append(pool.submit(tokenize_chunk, chunk))
+    while pending:
+        yield from pending.popleft().result()
 
 def index(target_path):
+    start_time = time.time() # includes compiling the kernels on a cold cache
     if not os.path.exists(INDEX_DIR):
         os.makedirs(INDEX_DIR)
-        
-    start_time = time.time()
+    enable_numba()
     
-    # In-memory index: term -> doc_id -> (freq, [positions], meta_mask)
-    mem_index = defaultdict(lambda: defaultdict(lambda: {'freq': 0, 'pos': [], 'meta': 0}))
+    # In-memory index: per-doc (hash, position, meta) rows in a ShardBuffer,
+    # spilled to a sorted shard whenever it grows past SHARD_BYTES
+    shard = ShardBuffer()
+    term_by_hash = {}
+    known_terms = 0 # len(term_by_hash) already charged to mem_bytes
+    mem_bytes = 0
+    shard_paths = []
     
     doc_id_counter = 1
+    next_progress = 0.0 # progress line is redrawn at most every 100 ms
+    clear_eol = "\x1b[K" if sys.stdout.isatty() else "" # no escape junk in redirected logs
     
-    with open(os.path.join(INDEX_DIR, DOCS_FILE), 'wb') as f_docs:
-        for root, dirs, files in os.walk(target_path):
-            if '.git' in dirs: dirs.remove('.git')
-            if 'node_modules' in dirs: dirs.remove('node_modules')
-            if '.devscope' in dirs: dirs.remove('.devscope')
+    # Workers tokenize; results come back in walk order, so doc ids are assigned
+    # here exactly as the serial loop did. A single core gains nothing from IPC.
+    # CPUs this process may run on, not the host's count (affinity/cpusets)
+    workers = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    with (ProcessPoolExecutor(max_workers=workers, initializer=enable_numba) if workers > 1 else contextlib.nullcontext()) as pool, \
+         open(os.path.join(INDEX_DIR, DOCS_FILE), 'wb', buffering=WRITE_BUFFER) as f_docs, \
+         open(os.path.join(INDEX_DIR, PATHS_FILE), 'wb', buffering=WRITE_BUFFER) as f_paths:
+        results = map_bounded(pool, iter_files(target_path), 2 * workers) if pool \
+            else (tokenize_file(job, term_by_hash) for job in iter_files(target_path))
+        for path, doc_type, hashes, lines, metas, terms, min_ts, max_ts in results:
+            if len(hashes) == 0 and doc_type == DOC_TYPE_CODE:
+                continue # Skip empty binary files purely identified by extension
             
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                doc_type = -1
-                if ext in ['.log']:
-                    doc_type = DOC_TYPE_LOG
-                elif ext in ['.go', '.py', '.js', '.ts', '.c', '.cpp', '.java', '.md', '.txt', '.json']:
-                    doc_type = DOC_TYPE_CODE
-                
-                if doc_type == -1: continue
-                
-                path = os.path.join(root, file)
-                
-                # Tokenize
-                tokens, min_ts, max_ts = tokenize(path, doc_type)
-                if not tokens and doc_type == DOC_TYPE_CODE:
-                    continue # Skip empty binary files purely identified by extension
-                
-                # Write Doc
-                write_doc(f_docs, doc_id_counter, doc_type, path, min_ts, max_ts)
-                
-                # meaningful tokens only?
-                # Update mem index
-                for term, pos, meta in tokens:
-                    entry = mem_index[term][doc_id_counter]
-                    entry['freq'] += 1
-                    entry['pos'].append(pos)
-                    entry['meta'] |= meta
-                
-                print(f"\rIndexed {doc_id_counter} files...", end="")
-                doc_id_counter += 1
-                
-    print(f"\nIndexing complete in {time.time() - start_time:.2f}s. Saving index...")
-    
-    # Write Index & Lexicon
-    with open(os.path.join(INDEX_DIR, INDEX_FILE), 'wb') as f_idx, \
-         open(os.path.join(INDEX_DIR, LEXICON_FILE), 'wb') as f_lex:
-         
-        terms = sorted(mem_index.keys())
-        offset_counter = 0
-        
-        for term in terms:
-            doc_map = mem_index[term]
-            doc_ids = sorted(doc_map.keys())
+            # Write Doc
+            write_doc(f_docs, f_paths, doc_id_counter, doc_type, path, min_ts, max_ts)
             
-            start_offset = offset_counter
+            # Update mem index
+            if terms is not term_by_hash:
+                term_by_hash.update(terms)
+            mem_bytes += shard.add(doc_id_counter, hashes, lines, metas)
+            mem_bytes += (len(term_by_hash) - known_terms) * TERM_OVERHEAD
+            known_terms = len(term_by_hash)
+            if mem_bytes > SHARD_BYTES:
+                shard_paths.append(os.path.join(INDEX_DIR, f"{INDEX_FILE}.part{len(shard_paths)}"))
+                write_shard(shard_paths[-1], iter_memory_terms(shard, term_by_hash))
+                # Cleared, not rebound: the serial path holds a reference to it
+                shard, mem_bytes, known_terms = ShardBuffer(), 0, 0
+                term_by_hash.clear()
             
-            for did in doc_ids:
-                entry = doc_map[did]
-                # DocID(4), Freq(4), Meta(1), PosCount(4), Positions(4*N)
-                header = struct.pack('<IIBI', did, entry['freq'], entry['meta'], len(entry['pos']))
-                f_idx.write(header)
-                offset_counter += 13
+            if time.monotonic() >= next_progress:
+                print(f"\rIndexed {doc_id_counter} files...{clear_eol}", end="", flush=True)
+                next_progress = time.monotonic() + 0.1
+            doc_id_counter += 1
                 
-                for p in entry['pos']:
-                    f_idx.write(struct.pack('<I', p))
-                    offset_counter += 4
-            
-            # Lexicon: TermLen(1), Term(N), DocFreq(4), Offset(8), Padding(4)
-            term_bytes = term.encode('utf-8')[:255]
-            f_lex.write(struct.pack('<B', len(term_bytes)))
-            f_lex.write(term_bytes)
-            f_lex.write(struct.pack('<IQI', len(doc_ids), start_offset, 0))
+    print(f"\rIndexed {doc_id_counter - 1} files...{clear_eol}", end="", flush=True)
+    print(f"\nIndexing complete in {time.time() - start_time:.2f}s. Saving index...")
+    
+    # Write Index & Lexicon: k-way merge of the shards plus what is still in memory.
+    # heapq.merge is stable, so a term's parts arrive in shard order, i.e. by doc_id.
+    sources = [iter_shard(p) for p in shard_paths] + [iter_memory_terms(shard, term_by_hash)]
+    merged = heapq.merge(*sources, key=lambda entry: entry[0])
+    write_index(concat_blocks(list(run)) for _, run in itertools.groupby(merged, key=lambda entry: entry[0]))
+    
+    for p in shard_paths:
+        os.remove(p)
 
 # --- Searcher ---
 
-def read_docs(path):
-    docs = {}
-    with open(path, 'rb') as f:
-        while True:
-            # Header: 4+1+2 = 7
-            header = f.read(7)
-            if not header: break
-            doc_id, dtype, path_len = struct.unpack('<IBH', header)
-            path_bytes = f.read(path_len)
-            meta = f.read(16)
-            doc = {
-                'id': doc_id,
-                'path': path_bytes.decode('utf-8'),
-                'type': dtype,
-            }
-            docs[doc_id] = doc
-    return docs
-
-def read_lexicon(path):
-    lex = {}
+def bloom_hashes(term):
+    # Two independent 64-bit hashes for double hashing
+    h1, h2 = struct.unpack('<QQ', hashlib.blake2b(term.encode('utf-8'), digest_size=16).digest())
+    return h1, h2 | 1
+
+class BloomFilter:
+    # Sized for n terms at the given false positive rate; ~1.2 bytes/term at 1%
+    def __init__(self, n, fpr=0.01, num_bits=None, num_hashes=None, bits=None):
+        n = max(n, 1)
+        self.num_bits = num_bits or max(64, math.ceil(-n * math.log(fpr) / math.log(2) ** 2))
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / n * math.log(2)))
+        self.bits = bits if bits is not None else np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def add_hashes(self, pairs):
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        # uint64 arithmetic wraps like the masked math in contains()
+        bit_idx = ((pairs[:, :1] + steps * pairs[:, 1:]) % np.uint64(self.num_bits)).ravel()
+        np.bitwise_or.at(self.bits, (bit_idx >> 3).astype(np.intp), (1 << (bit_idx & 7)).astype(np.uint8))
+
+    def contains(self, term):
+        h1, h2 = bloom_hashes(term)
+        for i in range(self.num_hashes):
+            bit = ((h1 + i * h2) & 0xFFFFFFFFFFFFFFFF) % self.num_bits
+            if not self.bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(BLOOM_HEADER.pack(self.num_bits, self.num_hashes))
+            f.write(self.bits.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        mm = open_mmap(path)
+        num_bits, num_hashes = BLOOM_HEADER.unpack_from(mm, 0)
+        bits = np.frombuffer(mm, dtype=np.uint8, offset=BLOOM_HEADER.size)
+        return cls(0, num_bits=num_bits, num_hashes=num_hashes, bits=bits)
+
+def open_mmap(path):
+    # Read-only map of the whole file; empty files cannot be mapped
     with open(path, 'rb') as f:
-        while True:
-            lb = f.read(1)
-            if not lb: break
-            length = struct.unpack('<B', lb)[0]
-            term = f.read(length).decode('utf-8')
-            meta = f.read(16)
-            df, offset, _ = struct.unpack('<IQI', meta)
-            lex[term] = {'df': df, 'offset': offset}
-    return lex
-
-def get_postings(f_idx, offset, doc_freq):
-    f_idx.seek(offset)
-    postings = []
-    for _ in range(doc_freq):
-        header = f_idx.read(13)
-        doc_id, freq, meta, pos_count = struct.unpack('<IIBI', header)
-        
-        pos_data = f_idx.read(4 * pos_count)
-        # Just skip reading positions into array if not needed for snippet yet, but we read to advance
-        # Actually simple array is fine
-        positions = []
-        # for i in range(pos_count):
-        #    positions.append(struct.unpack_from('<I', pos_data, i*4)[0])
-        # optimization: don't parse positions unless needed?
-        # We need positions for phrase search (not impl) or snippet line.
-        # Let's just store first position for now to save time
-        first_pos = 0
-        if pos_count > 0:
-            first_pos = struct.unpack_from('<I', pos_data, 0)[0]
-            
-        postings.append({'doc_id': doc_id, 'freq': freq, 'meta': meta, 'line': first_pos})
-    return postings
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class DocsMmap:
+    # docs[doc_id] is pointer arithmetic into docs.bin plus a slice of paths.bin
+    def __init__(self, docs_mm, paths_mm):
+        self.records = np.frombuffer(docs_mm, dtype=DOC_DTYPE)
+        self.ext_ids = self.records['ext_id'] # strided view, no copy
+        self.paths = paths_mm
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, doc_id):
+        _, dtype, _, path_offset, path_len, _, _ = self.records[doc_id - 1].item()
+        return {
+            'id': doc_id,
+            'path': self.paths[path_offset:path_offset + path_len].decode('utf-8'),
+            'type': dtype,
+        }
+
+class LexiconMmap:
+    # Bisects the hash-sorted entries, then checks the term text to rule out a collision
+    def __init__(self, lex_mm, terms_mm):
+        self.entries = np.frombuffer(lex_mm, dtype=LEX_DTYPE)
+        self.hashes = self.entries['hash'] # strided view, no copy
+        self.terms = terms_mm
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, term, default=None):
+        h = term_hash(term)
+        i = bisect.bisect_left(self.hashes, h)
+        if i == len(self.hashes) or self.hashes[i] != h:
+            return default
+        _, term_offset, term_len, df, offset = self.entries[i].item()
+        if self.terms[term_offset:term_offset + term_len] != term.encode('utf-8')[:255]:
+            return default
+        return {'df': df, 'offset': offset}
+
+    def __getitem__(self, term):
+        entry = self.get(term)
+        if entry is None:
+            raise KeyError(term)
+        return entry
+
+class Postings:
+    # Zero-copy views of one term's block in index.bin
+    __slots__ = ('doc_ids', 'freqs', 'pos_offsets', 'metas', 'idx', 'pos_base')
+
+    def __init__(self, idx, offset, doc_freq):
+        self.doc_ids = np.frombuffer(idx, dtype='<u4', count=doc_freq, offset=offset)
+        self.freqs = np.frombuffer(idx, dtype='<u4', count=doc_freq, offset=offset + 4 * doc_freq)
+        self.pos_offsets = np.frombuffer(idx, dtype='<u4', count=doc_freq, offset=offset + 8 * doc_freq)
+        self.metas = np.frombuffer(idx, dtype=np.uint8, count=doc_freq, offset=offset + 12 * doc_freq)
+        self.idx = idx
+        self.pos_base = offset + 13 * doc_freq
+
+    def first_line(self, i):
+        # Positions are only decoded on demand; the first varint is the first line
+        return decode_varint(self.idx, self.pos_base + int(self.pos_offsets[i]))[0]
+
+def get_postings(idx, offset, doc_freq):
+    return Postings(idx, offset, doc_freq)
+
+def find_line(mm, line_num, chunk=1 << 20):
+    # Byte offset where 1-based line_num starts; whole chunks are skipped by newline count
+    need, start = line_num - 1, 0
+    while need > 0:
+        block = mm[start:start + chunk]
+        if not block:
+            return -1
+        n = block.count(b'\n')
+        if n < need:
+            need -= n
+            start += len(block)
+            continue
+        pos = -1
+        for _ in range(need):
+            pos = block.find(b'\n', pos + 1)
+        return start + pos + 1
+    return start
+
+def intersect_sorted(small, big):
+    # Binary-search each id of the shorter list; only touches O(len(small) * log) of big
+    rows = np.searchsorted(big, small)
+    found = rows < len(big)
+    found[found] = big[rows[found]] == small[found]
+    return small[found]
 
 def search(query_str):
-    if not os.path.exists(INDEX_DIR):
+    # Not just INDEX_DIR: an interrupted first index can leave only _jitcache in it
+    if not os.path.exists(os.path.join(INDEX_DIR, LEXICON_FILE)):
         print("Index not found.")
         return
 
-    docs = read_docs(os.path.join(INDEX_DIR, DOCS_FILE))
-    lexicon = read_lexicon(os.path.join(INDEX_DIR, LEXICON_FILE))
+    docs = DocsMmap(open_mmap(os.path.join(INDEX_DIR, DOCS_FILE)),
+                    open_mmap(os.path.join(INDEX_DIR, PATHS_FILE)))
+    lexicon = LexiconMmap(open_mmap(os.path.join(INDEX_DIR, LEXICON_FILE)),
+                          open_mmap(os.path.join(INDEX_DIR, TERMS_FILE)))
+    bloom = BloomFilter.load(os.path.join(INDEX_DIR, BLOOM_FILE))
     total_docs = len(docs)
     
     parts = query_str.split()
@@ -250,57 +878,64 @@ def search(query_str):
     
     if not terms: return
     
-    scores = defaultdict(float)
-    matches = defaultdict(int)
+    idx = open_mmap(os.path.join(INDEX_DIR, INDEX_FILE))
+    postings = []
+    for term in terms:
+        entry = lexicon.get(term) if bloom.contains(term) else None
+        if entry is None:
+            postings = [] # implicit AND: an absent term matches nothing
+            break
+        idf = math.log10(total_docs / (entry['df'] + 1))
+        postings.append((get_postings(idx, entry['offset'], entry['df']), idf))
     
-    with open(os.path.join(INDEX_DIR, INDEX_FILE), 'rb') as f_idx:
-        for term in terms:
-            if term not in lexicon: continue
-            entry = lexicon[term]
-            
-            postings = get_postings(f_idx, entry['offset'], entry['df'])
-            idf = math.log10(total_docs / (entry['df'] + 1))
-            
-            for p in postings:
-                doc = docs[p['doc_id']]
-                
-                # Filters
-                if filters['ext'] and not doc['path'].lower().endswith(filters['ext']): continue
-                
-                if filters['level'] == 'ERROR':
-                     if not (p['meta'] & META_LOG_ERROR): continue
-                
-                # Scoring
-                score = p['freq'] * idf
-                if p['meta'] & META_IN_FILENAME: score += 5
-                if p['meta'] & META_IN_FUNCNAME: score += 3
-                if p['meta'] & META_LOG_ERROR: score += 2
-                
-                scores[p['doc_id']] += score
-                matches[p['doc_id']] += 1
-
-    # AND logic
-    results = []
-    for doc_id, count in matches.items():
-        if count == len(terms):
-            results.append((doc_id, scores[doc_id]))
-            
-    results.sort(key=lambda x: x[1], reverse=True)
+    # AND logic: intersect doc_id lists (sorted on disk), rarest term first
+    hits = np.empty(0, dtype=np.uint32)
+    if postings:
+        by_df = sorted((p for p, _ in postings), key=lambda p: len(p.doc_ids))
+        hits = by_df[0].doc_ids
+        for p in by_df[1:]:
+            hits = intersect_sorted(hits, p.doc_ids)
+            if len(hits) == 0: break
+    
+    # Filters
+    if filters['ext']:
+        ext_id = EXT_IDS.get('.' + filters['ext'].lstrip('.'), -1)
+        hits = hits[docs.ext_ids[hits.astype(np.intp) - 1] == ext_id]
+    
+    # Scoring, only for the surviving docs
+    keep = np.ones(len(hits), dtype=bool)
+    scores = np.zeros(len(hits), dtype=np.float64)
+    for p, idf in postings:
+        rows = np.searchsorted(p.doc_ids, hits)
+        metas = p.metas[rows]
+        
+        if filters['level'] == 'ERROR':
+            keep &= (metas & META_LOG_ERROR) != 0
+        
+        term_scores = p.freqs[rows] * idf
+        term_scores += 5 * ((metas & META_IN_FILENAME) != 0)
+        term_scores += 3 * ((metas & META_IN_FUNCNAME) != 0)
+        term_scores += 2 * ((metas & META_LOG_ERROR) != 0)
+        scores += term_scores
+    
+    hits, scores = hits[keep], scores[keep]
+    order = np.argsort(-scores, kind='stable')
+    results = list(zip(hits[order].tolist(), scores[order].tolist()))
     
     print(f"\nFound {len(results)} results.\n")
     for doc_id, score in results[:10]:
         doc = docs[doc_id]
         print(f"{doc['path']} (Score: {score:.2f})")
-        # Snippet
+        # Snippet: earliest stored first occurrence of any term, no rescan of the file
+        target_line = min(p.first_line(int(np.searchsorted(p.doc_ids, doc_id))) for p, _ in postings)
         try:
-            with open(doc['path'], 'r', errors='ignore') as f:
-                lines = f.readlines()
-                # Find line with term
-                for i, line in enumerate(lines):
-                    if any(t in line for t in terms):
-                        print(f"  {i+1}: {line.strip()[:200]}")
-                        break
-        except:
+            mm = open_mmap(doc['path'])
+            line_start = find_line(mm, target_line)
+            if line_start >= 0:
+                line_end = mm.find(b'\n', line_start)
+                line = mm[line_start:line_end if line_end >= 0 else len(mm)].decode('utf-8', errors='ignore')
+                print(f"  {target_line}: {line.strip()[:200]}")
+        except OSError:
             pass
         print()
 